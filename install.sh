@@ -9,7 +9,7 @@ sudo apt install -y build-essential python3-dev python3-virtualenv make gcc
 if [ ! -d venv ]; then
     python3 -m virtualenv venv
     venv/bin/pip install --upgrade pip
-    venv/bin/pip install cocotb cocotb-bus
+    venv/bin/pip install cocotb cocotb-bus pytest pytest-xdist
 fi
 
 source venv/bin/activate
@@ -32,11 +32,15 @@ WAIT_SHORT_CYCLES = 40   # Typical wait for single packet propagation
 WAIT_MEDIUM_CYCLES = 60  # Wait for packets through FIFO or longer paths
 WAIT_LONG_CYCLES = 200   # Wait for multiple packets or stress tests
 
-# Test data patterns
+# Cycles the mux adds on top of one cycle per word (skid buffer, port B
+# FIFO and arbiter stages, plus margin); see expected_latency()
+EXPECTED_LATENCY_CYCLES = 6
+
+# Test data patterns (tuples, so tests cannot mutate the shared config)
 TEST_DATA_PATTERNS = {
-    'simple': [0x1122334455667788, 0xDEADBEEFCAFEBABE],
-    'alternating': [0x0102030405060708, 0xA5A5A5A5A5A5A5A5, 0xFFFFFFFF00000000],
-    'all_ones': [0xFFFFFFFFFFFFFFFF],
-    'all_zeros': [0x0000000000000000],
-    'incrementing': list(range(0x1000, 0x1008)),
+    'simple': (0x1122334455667788, 0xDEADBEEFCAFEBABE),
+    'alternating': (0x0102030405060708, 0xA5A5A5A5A5A5A5A5, 0xFFFFFFFF00000000),
+    'all_ones': (0xFFFFFFFFFFFFFFFF,),
+    'all_zeros': (0x0000000000000000,),
+    'incrementing': tuple(range(0x1000, 0x1008)),
 }
@@ -2,16 +2,33 @@
 Avalon-ST Source Driver (BFM)
 Drives data/valid/sop/eop/empty/error and honors ready signal.
 """
+from collections import deque
+
 import cocotb
-from cocotb.triggers import RisingEdge
+from cocotb.triggers import Event, First, RisingEdge, Timer
+
+from config import CLOCK_PERIOD_NS, PACKET_TIMEOUT_CYCLES
+
+# Longest a single beat may stall on ready before the driver gives up
+_STALL_TIMEOUT_NS = PACKET_TIMEOUT_CYCLES * CLOCK_PERIOD_NS
 
 
-class AvalonSTSource:
+def _pack_beat(data_w, empty_w, data, valid, sop, eop, empty, error):
     """
-    Simple Avalon-ST source driver:
-    drives data/valid/sop/eop/empty/error and honors ready.
+    Pack one beat into the {error, empty, eop, sop, valid, data} layout
+    of the tb_top port bundles (data in the LSBs).
+    """
+    return ((error << (data_w + empty_w + 3)) | (empty << (data_w + 3)) |
+            (eop << (data_w + 2)) | (sop << (data_w + 1)) |
+            (valid << data_w) | data)
+
+
+class _AvalonSTSourceBase:
+    """
+    Port handles and beat driving shared by the Avalon-ST source drivers.
     """
-    def __init__(self, clk, data, valid, sop, eop, empty, error, ready):
+    def __init__(self, clk, data, valid, sop, eop, empty, error, ready, bundle=None,
+                 accepted=None):
         self.clk   = clk
         self.data  = data
         self.valid = valid
@@ -21,6 +38,79 @@ class AvalonSTSource:
         self.error = error
         self.ready = ready
 
+        # Optional packed port bundle (tb_top built with TB_BUNDLE_PORTS)
+        self.bundle   = bundle
+        self._data_w  = len(data)
+        self._empty_w = len(empty)
+
+        # Optional valid & ready strobe from tb_top; stalls wait on its
+        # rising edge rather than polling ready every clock
+        self.accepted = accepted
+        self._edge = RisingEdge(clk)
+        self._accept_edge = RisingEdge(accepted if accepted is not None else ready)
+        self._stall_timeout = Timer(_STALL_TIMEOUT_NS, unit='ns')
+
+    def _drive(self, data, sop, eop, empty, error, valid=1):
+        """
+        Drive one beat. With a port bundle this is a single signal write
+        instead of one write per field.
+        """
+        if self.bundle is not None:
+            self.bundle.value = _pack_beat(self._data_w, self._empty_w,
+                                           data, valid, sop, eop, empty, error)
+            return
+        self.data.value  = data
+        self.empty.value = empty
+        self.error.value = error
+        self.sop.value   = sop
+        self.eop.value   = eop
+        self.valid.value = valid
+
+    async def _wait_ready(self):
+        """
+        Wait for the clock edge at which the current beat is accepted.
+
+        While the beat is stalled, sleep on the accepted (or ready) edge
+        instead of waking on every clock, then re-check ready on the
+        following clock edge.
+
+        Raises:
+            TimeoutError: If ready stays low for PACKET_TIMEOUT_CYCLES
+        """
+        await self._edge
+        while not self.ready.value:
+            fired = await First(self._accept_edge, self._stall_timeout)
+            if fired is self._stall_timeout:
+                raise TimeoutError(
+                    f"{self.valid._name}: beat not accepted within "
+                    f"{PACKET_TIMEOUT_CYCLES} cycles")
+            await self._edge
+
+    def set_idle(self):
+        """Set driver to idle state."""
+        self._drive(0, 0, 0, 0, 0, valid=0)
+
+
+class AvalonSTSource(_AvalonSTSourceBase):
+    """
+    Simple Avalon-ST source driver:
+    drives data/valid/sop/eop/empty/error and honors ready.
+    """
+    def drive_beat(self, data, sop, eop, valid=1, empty=0, error=0):
+        """
+        Drive a single beat by hand, without waiting for ready.
+        For tests that build illegal or partial sequences beat by beat.
+        
+        Args:
+            data: Data word
+            sop: Start of packet flag
+            eop: End of packet flag
+            valid: Valid flag (default 1)
+            empty: Empty field value (default 0)
+            error: Error flag (default 0)
+        """
+        self._drive(data, sop, eop, empty, error, valid)
+
     async def send_packet(self, words, empty_last=0, error=False):
         """
         Send a packet with the given data words.
@@ -33,111 +123,108 @@ class AvalonSTSource:
         Note: AV_STREAM_RDY has 1 cycle delay, so ready signal responds
         one cycle after valid/data are asserted.
         """
-        # idle defaults
-        self.valid.value = 0
-        self.sop.value   = 0
-        self.eop.value   = 0
-        self.empty.value = 0
-        self.error.value = 0
-
-        await RisingEdge(self.clk)
+        # The port is already idle (set_idle/reset or the previous packet's
+        # idle tail) and the first beat overwrites every field, so no
+        # separate idle write is needed here
+        await self._edge
 
-        n = len(words)
+        drive = self._drive
+        wait_ready = self._wait_ready
+        last = len(words) - 1
+        err = 1 if error else 0
         for i, w in enumerate(words):
-            self.data.value  = w
-            self.empty.value = empty_last if i == n - 1 else 0
-            self.error.value = int(error)
-            self.sop.value   = int(i == 0)
-            self.eop.value   = int(i == n - 1)
-            self.valid.value = 1
+            # bool is an int subclass, so the compares drive sop/eop directly
+            drive(w, i == 0, i == last, empty_last if i == last else 0, err)
 
             # Wait for ready signal (accounts for 1-cycle delay in AV_STREAM_RDY)
             # When ready goes high, the transfer happens on that cycle
-            while True:
-                await RisingEdge(self.clk)
-                if self.ready.value:
-                    break
+            await wait_ready()
 
         # return to idle
-        self.valid.value = 0
-        self.sop.value   = 0
-        self.eop.value   = 0
-        self.empty.value = 0
-        self.error.value = 0
-        await RisingEdge(self.clk)
+        self.set_idle()
+        await self._edge
 
-    async def send_packet_with_backpressure(self, words, empty_last=0, error=False, 
-                                           ready_control=None):
+    async def send_packet_stream(self, packets, error=False):
         """
-        Send a packet with external ready control (for testing backpressure).
+        Send several packets back to back in one call.
+        valid stays high from the first SOP to the last EOP, so there is
+        no idle cycle between packets; the only waits are for ready.
         
         Args:
-            words: List of data words to send
-            empty_last: Empty field value for the last beat
-            error: Error flag value for the packet
-            ready_control: Coroutine that controls ready signal
+            packets: Sequence of (words, empty_last) tuples, as returned by
+                     create_packet
+            error: Error flag value for every packet
         """
-        # idle defaults
-        self.valid.value = 0
-        self.sop.value   = 0
-        self.eop.value   = 0
-        self.empty.value = 0
-        self.error.value = 0
+        await self._edge
 
-        await RisingEdge(self.clk)
+        drive = self._drive
+        wait_ready = self._wait_ready
+        err = 1 if error else 0
+        for words, empty_last in packets:
+            last = len(words) - 1
+            for i, w in enumerate(words):
+                drive(w, i == 0, i == last, empty_last if i == last else 0, err)
+                await wait_ready()
 
-        n = len(words)
-        for i, w in enumerate(words):
-            self.data.value  = w
-            self.empty.value = empty_last if i == n - 1 else 0
-            self.error.value = int(error)
-            self.sop.value   = int(i == 0)
-            self.eop.value   = int(i == n - 1)
-            self.valid.value = 1
-
-            # wait until DUT is ready and a transfer happens
-            while True:
-                await RisingEdge(self.clk)
-                if self.ready.value:
-                    break
+        # return to idle
+        self.set_idle()
+        await self._edge
+
+    async def send_rest(self, words, start, empty_last=0, error=False):
+        """
+        Finish a packet whose first beats were driven by hand (e.g. a SOP
+        beat raised together with the other port's): send words[start:],
+        one word per accepted edge, then return to idle.
+        
+        Args:
+            words: All data words of the packet
+            start: Index of the first word still to send
+            empty_last: Empty field value for the last beat
+            error: Error flag value for the packet
+        """
+        drive = self._drive
+        wait_ready = self._wait_ready
+        last = len(words) - 1
+        err = 1 if error else 0
+        for i in range(start, last + 1):
+            drive(words[i], i == 0, i == last, empty_last if i == last else 0, err)
+            await wait_ready()
 
         # return to idle
-        self.valid.value = 0
-        self.sop.value   = 0
-        self.eop.value   = 0
-        self.empty.value = 0
-        self.error.value = 0
-        await RisingEdge(self.clk)
+        self.set_idle()
+        await self._edge
 
-    def set_idle(self):
-        """Set driver to idle state."""
-        self.valid.value = 0
-        self.sop.value   = 0
-        self.eop.value   = 0
-        self.empty.value = 0
-        self.error.value = 0
+    async def send_packet_with_backpressure(self, words, empty_last=0, error=False):
+        """
+        Send a packet against a sink that applies backpressure.
+        Same as send_packet, which already holds each beat until ready.
+        
+        Args:
+            words: List of data words to send
+            empty_last: Empty field value for the last beat
+            error: Error flag value for the packet
+        """
+        await self.send_packet(words, empty_last, error)
 
 
-class AvalonSTQueuedSource:
+class AvalonSTQueuedSource(_AvalonSTSourceBase):
     """
     Avalon-ST source driver with packet queue.
     Can queue multiple packets and send them as ready allows.
     Non-blocking - packets are queued and sent in background.
     """
-    def __init__(self, clk, data, valid, sop, eop, empty, error, ready):
-        self.clk   = clk
-        self.data  = data
-        self.valid = valid
-        self.sop   = sop
-        self.eop   = eop
-        self.empty = empty
-        self.error = error
-        self.ready = ready
+    def __init__(self, clk, data, valid, sop, eop, empty, error, ready, bundle=None,
+                 accepted=None):
+        super().__init__(clk, data, valid, sop, eop, empty, error, ready,
+                         bundle=bundle, accepted=accepted)
         
-        self.packet_queue = []  # Queue of (words, empty_last, error) tuples
+        self.packet_queue = deque()  # Queue of packets, each a list of beat tuples
         self.current_packet = None
         self.current_word_idx = 0
-        self._running = False
+        self._task = None  # send task forked by queue_packet
+        self._work = Event()  # set by queue_packet, wakes an idle send task
+        self._idle = Event()  # set while nothing is queued or in flight
+        self._idle.set()
 
     async def queue_packet(self, words, empty_last=0, error=False):
         """
@@ -148,59 +235,53 @@ class AvalonSTQueuedSource:
             empty_last: Empty field value for the last beat
             error: Error flag value for the packet
         """
-        self.packet_queue.append((words, empty_last, error))
+        # Precompute (data, sop, eop, empty, error) per beat so the send
+        # task only unpacks and drives
+        last = len(words) - 1
+        err = 1 if error else 0
+        beats = [(w, i == 0, i == last, empty_last if i == last else 0, err)
+                 for i, w in enumerate(words)]
+        self.packet_queue.append(beats)
+        self._idle.clear()
+        self._work.set()
         
-        # Start the send task if not already running
-        if not self._running:
-            self._running = True
-            import cocotb
-            cocotb.start_soon(self._send_task())
+        # Start the send task if not already running; cocotb cancels it
+        # when the test that started it ends, so a reused source forks a
+        # new one in the next test
+        if self._task is None or self._task.done():
+            self._task = cocotb.start_soon(self._send_task())
 
     async def _send_task(self):
         """Background task that sends queued packets."""
         # Initialize to idle
-        self.valid.value = 0
-        self.sop.value   = 0
-        self.eop.value   = 0
-        self.empty.value = 0
-        self.error.value = 0
+        self.set_idle()
         
-        await RisingEdge(self.clk)
+        await self._edge
         
         while True:
             # Get next packet if we don't have one
             if self.current_packet is None:
                 if not self.packet_queue:
-                    # No packets, go idle
-                    self.valid.value = 0
-                    self.sop.value   = 0
-                    self.eop.value   = 0
-                    self.empty.value = 0
-                    self.error.value = 0
-                    await RisingEdge(self.clk)
+                    # No packets: sleep until queue_packet adds one instead
+                    # of waking every clock, then start on the next edge
+                    self._idle.set()
+                    self._work.clear()
+                    await self._work.wait()
+                    await self._edge
                     continue
                 
                 # Get next packet from queue
-                words, empty_last, error = self.packet_queue.pop(0)
-                self.current_packet = (words, empty_last, error)
+                self.current_packet = self.packet_queue.popleft()
                 self.current_word_idx = 0
             
             # Send current word
-            words, empty_last, error = self.current_packet
-            n = len(words)
-            i = self.current_word_idx
+            beats = self.current_packet
+            n = len(beats)
             
-            self.data.value  = words[i]
-            self.empty.value = empty_last if i == n - 1 else 0
-            self.error.value = int(error)
-            self.sop.value   = int(i == 0)
-            self.eop.value   = int(i == n - 1)
-            self.valid.value = 1
+            self._drive(*beats[self.current_word_idx])
             
             # Wait for ready
-            await RisingEdge(self.clk)
-            while not self.ready.value:
-                await RisingEdge(self.clk)
+            await self._wait_ready()
             
             # Move to next word
             self.current_word_idx += 1
@@ -208,14 +289,15 @@ class AvalonSTQueuedSource:
             # Check if packet is complete
             if self.current_word_idx >= n:
                 # Packet complete, return to idle
-                self.valid.value = 0
-                self.sop.value   = 0
-                self.eop.value   = 0
-                self.empty.value = 0
-                self.error.value = 0
+                self.set_idle()
                 self.current_packet = None
                 self.current_word_idx = 0
-                await RisingEdge(self.clk)
+                await self._edge
+
+    async def flush(self):
+        """Wait until every queued packet has been sent."""
+        if self.packet_queue or self.current_packet is not None:
+            await self._idle.wait()
 
     def get_queue_size(self):
         """Get number of packets in queue."""
@@ -226,15 +308,8 @@ class AvalonSTQueuedSource:
 
     def clear_queue(self):
         """Clear all queued packets."""
-        self.packet_queue = []
+        self.packet_queue = deque()
         self.current_packet = None
         self.current_word_idx = 0
-
-    def set_idle(self):
-        """Set driver to idle state (stops sending but keeps queue)."""
-        self.valid.value = 0
-        self.sop.value   = 0
-        self.eop.value   = 0
-        self.empty.value = 0
-        self.error.value = 0
+        self._idle.set()
 
@@ -0,0 +1,14 @@
+`timescale 1ns/1ps
+
+// Free-running testbench clock. Generated in HDL so the simulator
+// toggles it without a Python callback per edge.
+module tb_clkgen #(
+    parameter realtime PERIOD_NS = 6.4  // 156.25 MHz, matches config.CLOCK_PERIOD_NS
+)(
+    output logic clk
+);
+
+    initial clk = 1'b0;
+    always #(PERIOD_NS / 2) clk = ~clk;
+
+endmodule
@@ -0,0 +1,186 @@
+`timescale 1ns/1ps
+
+import packet_mux_pkg::*;
+
+// Simulation toplevel for the cocotb testbench.
+// Keeps the DUT port names at this level so tests can keep using
+// dut.porta_data, dut.portc_ready, ... and generates the clock in HDL
+// (tb_clkgen), so the simulator toggles it without a Python callback per edge.
+module tb_top #(
+    parameter DATA_W       = packet_mux_pkg::DATA_W, // 64
+    parameter EMP_W        = packet_mux_pkg::EMPTY_W, // 3
+    parameter realtime CLK_PERIOD_NS = 6.4  // 156.25 MHz, matches config.CLOCK_PERIOD_NS
+);
+
+    logic              clk;
+    logic              rst_n;
+
+    // --- PORT A (High Priority) ---
+    logic [DATA_W-1:0] porta_data;
+    logic              porta_valid;
+    logic              porta_sop;
+    logic              porta_eop;
+    logic [EMP_W-1:0]  porta_empty;
+    logic              porta_error;
+    logic              porta_ready;
+
+    // --- PORT B (Low Priority) ---
+    logic [DATA_W-1:0] portb_data;
+    logic              portb_valid;
+    logic              portb_sop;
+    logic              portb_eop;
+    logic [EMP_W-1:0]  portb_empty;
+    logic              portb_error;
+    logic              portb_ready;
+
+    // --- PORT C (Output) ---
+    logic [DATA_W-1:0] portc_data;
+    logic              portc_valid;
+    logic              portc_sop;
+    logic              portc_eop;
+    logic [EMP_W-1:0]  portc_empty;
+    logic              portc_error;
+    logic              portc_ready;
+
+    // Transfer strobes (valid & ready): drivers and monitors sleep on
+    // these instead of sampling every clock while a port is stalled/idle.
+    // Built from the valids the DUT actually sees (see dut_a_valid below).
+    logic              porta_accepted;
+    logic              portb_accepted;
+    logic              portc_accepted;
+
+`ifdef TB_BUNDLE_PORTS
+    // ------------------------------------------------------------
+    // Packed input bundles: {error, empty, eop, sop, valid, data}
+    // A driver updates a whole beat with a single signal write.
+    // ------------------------------------------------------------
+    localparam BUNDLE_W = DATA_W + EMP_W + 4;
+
+    logic [BUNDLE_W-1:0] porta_bundle;
+    logic [BUNDLE_W-1:0] portb_bundle;
+
+    assign {porta_error, porta_empty, porta_eop, porta_sop, porta_valid, porta_data} = porta_bundle;
+    assign {portb_error, portb_empty, portb_eop, portb_sop, portb_valid, portb_data} = portb_bundle;
+`endif
+
+    // ------------------------------------------------------------
+    // Clock generation
+    // ------------------------------------------------------------
+    tb_clkgen #(.PERIOD_NS(CLK_PERIOD_NS)) u_clkgen (.clk(clk));
+
+`ifdef TRACE
+    // ------------------------------------------------------------
+    // Waveform dump (WAVES=1 builds only); +dumpfile=<path> overrides
+    // the default file
+    // ------------------------------------------------------------
+    initial begin
+        string dumpfile;
+        if (!$value$plusargs("dumpfile=%s", dumpfile))
+            dumpfile = "sim_build/dump.vcd";
+        $dumpfile(dumpfile);
+        $dumpvars(0, tb_top);
+    end
+`endif
+
+    // ------------------------------------------------------------
+    // Concurrent-SOP stimulus: a test pulses sop_stress_start and
+    // waits for sop_stress_busy to fall. While busy, the stimulus
+    // owns the port A/B inputs instead of the Python-driven signals.
+    // ------------------------------------------------------------
+    logic              sop_stress_start;
+    logic              sop_stress_busy;
+
+    logic [DATA_W-1:0] stim_a_data;
+    logic              stim_a_valid;
+    logic              stim_a_sop;
+    logic              stim_a_eop;
+    logic [DATA_W-1:0] stim_b_data;
+    logic              stim_b_valid;
+    logic              stim_b_sop;
+    logic              stim_b_eop;
+
+    initial sop_stress_start = 1'b0;
+
+    // Port A/B valids after the stimulus mux
+    logic              dut_a_valid;
+    logic              dut_b_valid;
+
+    assign dut_a_valid = sop_stress_busy ? stim_a_valid : porta_valid;
+    assign dut_b_valid = sop_stress_busy ? stim_b_valid : portb_valid;
+
+    assign porta_accepted = dut_a_valid & porta_ready;
+    assign portb_accepted = dut_b_valid & portb_ready;
+    assign portc_accepted = portc_valid & portc_ready;
+
+    tb_sop_stress #(.DATA_W(DATA_W)) u_sop_stress (
+        .clk     (clk),
+        .rst_n   (rst_n),
+        .start   (sop_stress_start),
+        .busy    (sop_stress_busy),
+        .a_data  (stim_a_data),
+        .a_valid (stim_a_valid),
+        .a_sop   (stim_a_sop),
+        .a_eop   (stim_a_eop),
+        .a_ready (porta_ready),
+        .b_data  (stim_b_data),
+        .b_valid (stim_b_valid),
+        .b_sop   (stim_b_sop),
+        .b_eop   (stim_b_eop),
+        .b_ready (portb_ready)
+    );
+
+    // ------------------------------------------------------------
+    // DUT
+    // ------------------------------------------------------------
+    packet_mux_top #(DATA_W, EMP_W) u_dut (
+        .clk         (clk),
+        .rst_n       (rst_n),
+
+        .porta_data  (sop_stress_busy ? stim_a_data  : porta_data),
+        .porta_valid (dut_a_valid),
+        .porta_sop   (sop_stress_busy ? stim_a_sop   : porta_sop),
+        .porta_eop   (sop_stress_busy ? stim_a_eop   : porta_eop),
+        .porta_empty (sop_stress_busy ? '0           : porta_empty),
+        .porta_error (sop_stress_busy ? 1'b0         : porta_error),
+        .porta_ready (porta_ready),
+
+        .portb_data  (sop_stress_busy ? stim_b_data  : portb_data),
+        .portb_valid (dut_b_valid),
+        .portb_sop   (sop_stress_busy ? stim_b_sop   : portb_sop),
+        .portb_eop   (sop_stress_busy ? stim_b_eop   : portb_eop),
+        .portb_empty (sop_stress_busy ? '0           : portb_empty),
+        .portb_error (sop_stress_busy ? 1'b0         : portb_error),
+        .portb_ready (portb_ready),
+
+        .portc_data  (portc_data),
+        .portc_valid (portc_valid),
+        .portc_sop   (portc_sop),
+        .portc_eop   (portc_eop),
+        .portc_empty (portc_empty),
+        .portc_error (portc_error),
+        .portc_ready (portc_ready)
+    );
+
+    // ------------------------------------------------------------
+    // DUT idle: arbiter in IDLE, both skid buffers empty and nothing
+    // held in the port B FIFO. Tests only skip the reset between them
+    // while this is high (test_fixtures._dut_quiescent).
+    //
+    // Probes these RTL internals by hierarchical path; keep in sync:
+    //   u_dut.u_arbiter.current_state  (pm_state_t, label ST_IDLE)
+    //   u_dut.u_skid_a/u_skid_b.use_buffer
+    //   u_dut.u_fifo_b.r_valid
+    // The state is matched by label rather than encoding, so re-encoding
+    // the FSM is harmless; renaming ST_IDLE leaves dut_idle low, which
+    // only costs a reset per test. A renamed signal fails to elaborate.
+    // ------------------------------------------------------------
+    logic              dut_idle;
+
+    always_comb begin
+        dut_idle = (u_dut.u_arbiter.current_state.name() == "ST_IDLE") &&
+                   !u_dut.u_skid_a.use_buffer &&
+                   !u_dut.u_skid_b.use_buffer &&
+                   !u_dut.u_fifo_b.r_valid;
+    end
+
+endmodule
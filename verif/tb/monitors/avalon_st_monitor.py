@@ -2,16 +2,24 @@
 Avalon-ST Sink Monitor
 Monitors and collects packets from the output port.
 """
+import struct
+from collections import deque
+
 import cocotb
-from cocotb.triggers import RisingEdge
+from cocotb.triggers import RisingEdge, ReadOnly, Event, ClockCycles, First
+from config import MAX_PACKET_BYTES, BYTES_PER_WORD
+
+# Words in the largest legal packet, including a partially used last word
+# (MAX_PACKET_WORDS only counts full words)
+_PKT_BUF_WORDS = (MAX_PACKET_BYTES + BYTES_PER_WORD - 1) // BYTES_PER_WORD
 
 
-class AvalonSTSink:
+class _AvalonSTSinkBase:
     """
-    Simple Avalon-ST monitor for the output port C.
-    Collects packets as lists of data words.
+    Port handles, beat capture and packet bookkeeping shared by the
+    Avalon-ST sink monitors.
     """
-    def __init__(self, clk, data, valid, sop, eop, empty, error, ready):
+    def __init__(self, clk, data, valid, sop, eop, empty, error, ready, accepted=None):
         self.clk   = clk
         self.data  = data
         self.valid = valid
@@ -21,85 +29,174 @@ class AvalonSTSink:
         self.error = error
         self.ready = ready
 
-        self.packets = []   # list[list[int]]
-        self._cur_pkt = []
+        # Optional valid & ready strobe from tb_top; when nothing is being
+        # transferred the monitor sleeps on its rising edge instead of
+        # sampling every clock
+        self.accepted = accepted
+        self._edge = RisingEdge(clk)
+        self._accept_edge = RisingEdge(accepted) if accepted is not None else None
+
+        self.packets = deque()  # deque[list[int]]
+        self.packets_bytes = deque()  # same packets as little-endian bytes
+        self._cur_pkt = []  # preallocated at SOP, filled up to _cur_len
+        self._cur_len = 0
         self._in_pkt  = False
-        self._packet_metadata = []  # Store metadata for each packet
+        # Per-packet EOP metadata, one byte per packet in packet order
+        self.empties = bytearray()
+        self.errors  = bytearray()
+        self._pkt_done = Event()    # set each time a packet is completed
 
-    async def run(self, always_ready=True):
+    @property
+    def in_packet(self):
+        """True between a captured SOP beat and its EOP beat."""
+        return self._in_pkt
+
+    def _capture_beat(self):
         """
-        Monitor task that collects packets.
-        
-        Args:
-            always_ready: If True, always assert ready. If False, ready is controlled externally.
+        Record the beat on the port; the caller has already seen
+        valid && ready in the ReadOnly phase.
         """
-        if always_ready:
-            self.ready.value = 1
+        if self.sop.value:
+            # start of new packet
+            self._cur_pkt = [0] * _PKT_BUF_WORDS
+            self._cur_len = 0
+            self._in_pkt  = True
 
-        while True:
-            await RisingEdge(self.clk)
-            if self.valid.value and self.ready.value:
-                d = int(self.data.value)
-                empty_val = int(self.empty.value)
-                error_val = int(self.error.value)
-
-                if self.sop.value:
-                    # start of new packet
-                    self._cur_pkt = []
-                    self._in_pkt  = True
-
-                if self._in_pkt:
-                    self._cur_pkt.append(d)
-
-                if self.eop.value:
-                    # end of packet
-                    if self._in_pkt:
-                        self.packets.append(self._cur_pkt.copy())
-                        self._packet_metadata.append({
-                            'empty': empty_val,
-                            'error': error_val
-                        })
-                    self._cur_pkt = []
-                    self._in_pkt  = False
+        if self._in_pkt:
+            # IndexError here means a packet longer than MAX_PACKET_BYTES
+            self._cur_pkt[self._cur_len] = int(self.data.value)
+            self._cur_len += 1
+
+        if self.eop.value:
+            # end of packet; empty/error only matter on this beat
+            if self._in_pkt:
+                # trim in place and hand the list over, no copy
+                del self._cur_pkt[self._cur_len:]
+                self.packets.append(self._cur_pkt)
+                self.packets_bytes.append(
+                    struct.pack(f'<{self._cur_len}Q', *self._cur_pkt))
+                self.empties.append(int(self.empty.value))
+                self.errors.append(int(self.error.value))
+                self._pkt_done.set()
+            self._cur_pkt = []
+            self._in_pkt  = False
 
     def clear(self):
         """Clear collected packets."""
-        self.packets = []
-        self._packet_metadata = []
+        self.packets = deque()
+        self.packets_bytes = deque()
+        self.empties = bytearray()
+        self.errors  = bytearray()
         self._cur_pkt = []
+        self._cur_len = 0
         self._in_pkt = False
+        self._pkt_done.clear()
 
     def get_packet_count(self):
         """Get number of packets collected."""
         return len(self.packets)
 
+    async def expect(self, n, timeout_cycles, clk=None):
+        """
+        Wait until at least n packets have been collected.
+        Wakes once per completed packet instead of once per clock.
+        Packets complete in the ReadOnly phase, so after waking on one this
+        returns on the next clock edge, where the caller may drive signals.
+        
+        Args:
+            n: Number of packets to wait for
+            timeout_cycles: Maximum cycles to wait for each packet
+            clk: Clock the timeout is counted on (defaults to the port clock)
+        
+        Returns:
+            True if n packets were received, False on timeout
+        """
+        if clk is None:
+            clk = self.clk
+        done = self._pkt_done
+        woken = False
+        while len(self.packets) < n:
+            done.clear()
+            timeout = ClockCycles(clk, timeout_cycles)
+            if await First(done.wait(), timeout) is timeout:
+                return len(self.packets) >= n
+            woken = True
+        if woken:
+            # leave the ReadOnly phase _pkt_done was set in
+            await RisingEdge(clk)
+        return True
+
     def get_last_packet_metadata(self):
         """Get metadata for the last packet."""
-        if self._packet_metadata:
-            return self._packet_metadata[-1]
+        if self.errors:
+            return {'empty': self.empties[-1], 'error': self.errors[-1]}
         return None
 
 
-class AvalonSTSinkWithBackpressure:
+class AvalonSTSink(_AvalonSTSinkBase):
     """
-    Avalon-ST monitor with controllable ready signal for backpressure testing.
+    Simple Avalon-ST monitor for the output port C.
+    Collects packets as lists of data words.
     """
-    def __init__(self, clk, data, valid, sop, eop, empty, error, ready):
-        self.clk   = clk
-        self.data  = data
-        self.valid = valid
-        self.sop   = sop
-        self.eop   = eop
-        self.empty = empty
-        self.error = error
-        self.ready = ready
+    def __init__(self, clk, data, valid, sop, eop, empty, error, ready, accepted=None):
+        super().__init__(clk, data, valid, sop, eop, empty, error, ready,
+                         accepted=accepted)
+        self._task = None  # monitor task forked by start()
 
-        self.packets = []
-        self._cur_pkt = []
-        self._in_pkt  = False
+    def start(self):
+        """
+        Fork the monitor task (run()) unless it is already running.
+        cocotb cancels the tasks a test started when that test ends, so
+        this forks at most once per test however often it is called.
+        
+        Returns:
+            The running monitor task
+        """
+        if self._task is None or self._task.done():
+            self._task = cocotb.start_soon(self.run())
+        return self._task
+
+    async def run(self, always_ready=True):
+        """
+        Monitor task that collects packets.
+        
+        Args:
+            always_ready: If True, always assert ready. If False, ready is controlled externally.
+        """
+        if always_ready:
+            self.ready.value = 1
+
+        # Bind handles and triggers once; the loop runs every transfer
+        valid, ready = self.valid, self.ready
+        edge, accept_edge = self._edge, self._accept_edge
+        capture = self._capture_beat
+        read_only = ReadOnly()
+
+        # Signals are sampled in the ReadOnly phase after each edge, once
+        # all writes and delta cycles of that timestep have settled; a beat
+        # seen with valid && ready there is captured on the next edge.
+        while True:
+            await edge
+            await read_only
+            if not (valid.value and ready.value):
+                if accept_edge is None:
+                    continue
+                # Nothing in flight: sleep until a transfer is set up
+                await accept_edge
+                await read_only
+                if not (valid.value and ready.value):
+                    continue
+            capture()
+
+
+class AvalonSTSinkWithBackpressure(_AvalonSTSinkBase):
+    """
+    Avalon-ST monitor with controllable ready signal for backpressure testing.
+    """
+    def __init__(self, clk, data, valid, sop, eop, empty, error, ready, accepted=None):
+        super().__init__(clk, data, valid, sop, eop, empty, error, ready,
+                         accepted=accepted)
         self._ready_state = True
-        self._last_data = None  # Track last collected data to avoid duplicates
-        self._last_valid_ready = False  # Track previous valid&&ready state
 
     async def run(self, ready_pattern=None):
         """
@@ -110,26 +207,27 @@ class AvalonSTSinkWithBackpressure:
                           If None, ready is always asserted.
                           Pattern repeats if it completes.
         """
+        # Bind handles and triggers once; the loops run every transfer/cycle
+        valid, ready = self.valid, self.ready
+        edge, accept_edge = self._edge, self._accept_edge
+        capture = self._capture_beat
+        read_only = ReadOnly()
+
+        # Sampling happens in the ReadOnly phase, as in AvalonSTSink.run
         if ready_pattern is None:
-            self.ready.value = 1
+            ready.value = 1
             self._ready_state = True
             while True:
-                await RisingEdge(self.clk)
-                if self.valid.value and self.ready.value:
-                    d = int(self.data.value)
-
-                    if self.sop.value:
-                        self._cur_pkt = []
-                        self._in_pkt  = True
-
-                    if self._in_pkt:
-                        self._cur_pkt.append(d)
-
-                    if self.eop.value:
-                        if self._in_pkt:
-                            self.packets.append(self._cur_pkt.copy())
-                        self._cur_pkt = []
-                        self._in_pkt  = False
+                await edge
+                await read_only
+                if not (valid.value and ready.value):
+                    if accept_edge is None:
+                        continue
+                    await accept_edge
+                    await read_only
+                    if not (valid.value and ready.value):
+                        continue
+                capture()
         else:
             # Pattern-based ready control
             pattern_idx = 0
@@ -141,7 +239,7 @@ class AvalonSTSinkWithBackpressure:
                 self._ready_state = bool(state)
 
             while True:
-                await RisingEdge(self.clk)
+                await edge
                 cycles_in_pattern += 1
                 
                 # Update ready based on pattern
@@ -163,63 +261,12 @@ class AvalonSTSinkWithBackpressure:
                                 self.ready.value = int(state)
                                 self._ready_state = bool(state)
 
-                # Collect packet data
-                # Track transfers to avoid collecting duplicates when same data is held for multiple cycles
-                current_valid_ready = (self.valid.value and self.ready.value)
-                
-                if current_valid_ready:
-                    d = int(self.data.value)
-                    
-                    # Handle SOP - start new packet
-                    if self.sop.value:
-                        self._cur_pkt = []
-                        self._in_pkt  = True
-                        # Reset last_data on new packet
-                        self._last_data = None
-                        self._last_valid_ready = False  # Force collection on first word
-                    
-                    # Only collect if:
-                    # 1. Rising edge of valid&&ready (new transfer after backpressure), OR
-                    # 2. Data changed from last collected (new word)
-                    # This prevents duplicate collection when same data is held for multiple cycles,
-                    # but allows collection when ready goes high after backpressure
-                    is_rising_edge = not self._last_valid_ready
-                    data_changed = (self._last_data is not None and d != self._last_data)
-                    is_new_data = (self._last_data is None or d != self._last_data)
-                    
-                    # Collect on rising edge (even if same data) OR when data changes
-                    if (is_rising_edge or data_changed) and self._in_pkt:
-                        self._last_data = d
-                        self._cur_pkt.append(d)
-                    
-                    self._last_valid_ready = True
-
-                    # Handle EOP - end packet
-                    if self.eop.value and self._in_pkt:
-                        self.packets.append(self._cur_pkt.copy())
-                        self._cur_pkt = []
-                        self._in_pkt  = False
-                        # Reset last_data after packet ends
-                        self._last_data = None
-                else:
-                    # Reset tracking when not in transfer (backpressure)
-                    self._last_valid_ready = False
-                    # Keep last_data to detect if same data appears again after backpressure
+                # Collect packet data: one beat per valid && ready edge
+                await read_only
+                if valid.value and ready.value:
+                    capture()
 
     def set_ready(self, value):
         """Set ready signal value."""
         self.ready.value = int(value)
         self._ready_state = bool(value)
-
-    def get_packet_count(self):
-        """Get number of packets collected."""
-        return len(self.packets)
-
-    def clear(self):
-        """Clear collected packets."""
-        self.packets = []
-        self._cur_pkt = []
-        self._in_pkt = False
-        self._last_data = None
-        self._last_valid_ready = False
-
@@ -1,15 +1,17 @@
 """
 Common test fixtures and setup functions
 """
-import cocotb
-from cocotb.clock import Clock
+import functools
+
 from drivers.avalon_st_driver import AvalonSTSource, AvalonSTQueuedSource
 from monitors.avalon_st_monitor import AvalonSTSink, AvalonSTSinkWithBackpressure
-from utils.test_utils import reset_dut, setup_clock, wait_cycles
+from utils.test_utils import reset_dut, words_to_bytes
+from config import EXPECTED_LATENCY_CYCLES
 
 
+@functools.lru_cache(maxsize=None)
 def _get_port_a_signals(dut):
-    """Get signal dictionary for port A."""
+    """Get signal dictionary for port A (resolved once per DUT, do not modify)."""
     return {
         'clk': dut.clk,
         'data': dut.porta_data,
@@ -19,11 +21,14 @@ def _get_port_a_signals(dut):
         'empty': dut.porta_empty,
         'error': dut.porta_error,
         'ready': dut.porta_ready,
+        'bundle': getattr(dut, 'porta_bundle', None),
+        'accepted': getattr(dut, 'porta_accepted', None),
     }
 
 
+@functools.lru_cache(maxsize=None)
 def _get_port_b_signals(dut):
-    """Get signal dictionary for port B."""
+    """Get signal dictionary for port B (resolved once per DUT, do not modify)."""
     return {
         'clk': dut.clk,
         'data': dut.portb_data,
@@ -33,11 +38,14 @@ def _get_port_b_signals(dut):
         'empty': dut.portb_empty,
         'error': dut.portb_error,
         'ready': dut.portb_ready,
+        'bundle': getattr(dut, 'portb_bundle', None),
+        'accepted': getattr(dut, 'portb_accepted', None),
     }
 
 
+@functools.lru_cache(maxsize=None)
 def _get_port_c_signals(dut):
-    """Get signal dictionary for port C."""
+    """Get signal dictionary for port C (resolved once per DUT, do not modify)."""
     return {
         'clk': dut.clk,
         'data': dut.portc_data,
@@ -47,23 +55,50 @@ def _get_port_c_signals(dut):
         'empty': dut.portc_empty,
         'error': dut.portc_error,
         'ready': dut.portc_ready,
+        'accepted': getattr(dut, 'portc_accepted', None),
     }
 
 
+# Environments built so far, keyed by id(dut); the handles and drivers
+# stay valid for the whole simulation, so tests share one set
+_ENV_CACHE = {}
+
+# Backpressure sinks built so far, keyed by id(dut) (see _ENV_CACHE)
+_BP_SINK_CACHE = {}
+
+# Queued sources built so far, keyed by (id(dut), port) (see _ENV_CACHE)
+_QUEUED_SRC_CACHE = {}
+
+# True once bring_up has reset the DUT and only bring_up tests have run
+# since. Every fixture that is not reached through bring_up
+# (create_test_environment called directly, create_sink_with_backpressure)
+# clears it, so the next bring_up resets again.
+_LAST_RESET_OK = False
+
+
 def create_test_environment(dut):
     """
-    Create a standard test environment with clock, drivers, and monitor.
+    Create a standard test environment with drivers and monitor.
+    The clock is generated on the HDL side by tb_top.
+
+    The environment is built once per DUT and reused by later tests,
+    with the sink's collected packets cleared.
     
     Args:
         dut: Device under test
     
     Returns:
-        Dictionary with 'clock', 'src_a', 'src_b', 'sink_c'
+        Dictionary with 'src_a', 'src_b', 'sink_c'
     """
-    # Setup clock
-    clock = setup_clock(dut)
-    cocotb.start_soon(clock)
-    
+    global _LAST_RESET_OK
+    _LAST_RESET_OK = False
+
+    key = id(dut)
+    env = _ENV_CACHE.get(key)
+    if env is not None:
+        env['sink_c'].clear()
+        return env
+
     # Create drivers
     src_a = AvalonSTSource(**_get_port_a_signals(dut))
     src_b = AvalonSTSource(**_get_port_b_signals(dut))
@@ -71,17 +106,70 @@ def create_test_environment(dut):
     # Create monitor
     sink_c = AvalonSTSink(**_get_port_c_signals(dut))
     
-    return {
-        'clock': clock,
+    env = {
         'src_a': src_a,
         'src_b': src_b,
         'sink_c': sink_c
     }
+    _ENV_CACHE[key] = env
+    return env
+
+
+async def bring_up(dut):
+    """
+    Bring the testbench up in one call: get the (cached) environment,
+    reset the DUT and make sure the port C sink is running.
+
+    The reset is skipped when the previous test was also set up by
+    bring_up and left the DUT quiescent (see _dut_quiescent).
+
+    The sink task is only forked when it is not already running (see
+    AvalonSTSink.start).
+    
+    Args:
+        dut: Device under test
+    
+    Returns:
+        Dictionary with test environment (same as create_test_environment)
+    """
+    global _LAST_RESET_OK
+    # Judge the previous test's end state before the sink is cleared
+    skip_reset = _LAST_RESET_OK and _dut_quiescent(dut, _ENV_CACHE.get(id(dut)))
+
+    env = create_test_environment(dut)
+    if not skip_reset:
+        await reset_dut(dut)
+    env['sink_c'].start()
+    _LAST_RESET_OK = True
+    return env
+
+
+def _dut_quiescent(dut, env):
+    """
+    Whether the DUT is idle enough to start a test without a reset:
+    out of reset, the SOP stimulus stopped, no input or output beat
+    pending, the sink not inside a packet, and tb_top's dut_idle high
+    (arbiter in IDLE, skid buffers and port B FIFO empty). An aborted
+    packet or data left in the FIFO fails the check even while every
+    valid reads 0.
+    """
+    if env is None:
+        return False
+    return (int(dut.rst_n.value) == 1 and
+            int(dut.dut_idle.value) == 1 and
+            int(dut.sop_stress_busy.value) == 0 and
+            int(dut.porta_valid.value) == 0 and
+            int(dut.portb_valid.value) == 0 and
+            int(dut.portc_valid.value) == 0 and
+            not env['sink_c'].in_packet)
 
 
 def create_sink_with_backpressure(dut):
     """
     Create an Avalon-ST sink monitor with backpressure control for port C.
+
+    Like the environment, the sink is built once per DUT and reused by
+    later tests, with its collected packets cleared.
     
     Args:
         dut: Device under test
@@ -89,12 +177,40 @@ def create_sink_with_backpressure(dut):
     Returns:
         AvalonSTSinkWithBackpressure instance
     """
-    return AvalonSTSinkWithBackpressure(**_get_port_c_signals(dut))
+    global _LAST_RESET_OK
+    _LAST_RESET_OK = False
+
+    key = id(dut)
+    sink = _BP_SINK_CACHE.get(key)
+    if sink is not None:
+        sink.clear()
+        return sink
+    sink = AvalonSTSinkWithBackpressure(**_get_port_c_signals(dut))
+    _BP_SINK_CACHE[key] = sink
+    return sink
+
+
+def _get_queued_source(dut, port, signals):
+    """
+    Return the cached queued source for one port, built on first use;
+    a reused source starts the test with an empty queue.
+    """
+    key = (id(dut), port)
+    src = _QUEUED_SRC_CACHE.get(key)
+    if src is not None:
+        src.clear_queue()
+        return src
+    src = AvalonSTQueuedSource(**signals)
+    _QUEUED_SRC_CACHE[key] = src
+    return src
 
 
 def create_queued_source_a(dut):
     """
     Create an Avalon-ST queued source driver for port A.
+
+    Built once per DUT and reused by later tests (see
+    create_sink_with_backpressure).
     
     Args:
         dut: Device under test
@@ -102,12 +218,15 @@ def create_queued_source_a(dut):
     Returns:
         AvalonSTQueuedSource instance for port A
     """
-    return AvalonSTQueuedSource(**_get_port_a_signals(dut))
+    return _get_queued_source(dut, 'a', _get_port_a_signals(dut))
 
 
 def create_queued_source_b(dut):
     """
     Create an Avalon-ST queued source driver for port B.
+
+    Built once per DUT and reused by later tests (see
+    create_sink_with_backpressure).
     
     Args:
         dut: Device under test
@@ -115,7 +234,7 @@ def create_queued_source_b(dut):
     Returns:
         AvalonSTQueuedSource instance for port B
     """
-    return AvalonSTQueuedSource(**_get_port_b_signals(dut))
+    return _get_queued_source(dut, 'b', _get_port_b_signals(dut))
 
 
 async def setup_test_with_idle_port(dut, idle_port='b'):
@@ -129,9 +248,7 @@ async def setup_test_with_idle_port(dut, idle_port='b'):
     Returns:
         Dictionary with test environment (same as create_test_environment)
     """
-    env = create_test_environment(dut)
-    await reset_dut(dut)
-    cocotb.start_soon(env['sink_c'].run())
+    env = await bring_up(dut)
     
     if idle_port.lower() == 'a':
         env['src_a'].set_idle()
@@ -141,13 +258,27 @@ async def setup_test_with_idle_port(dut, idle_port='b'):
     return env
 
 
+def expected_latency(pkt):
+    """
+    Upper bound in cycles for a packet to come out of port C once the
+    DUT starts taking it.
+    
+    Args:
+        pkt: Packet data (list of words)
+    
+    Returns:
+        Number of cycles to wait for the packet
+    """
+    return len(pkt) + EXPECTED_LATENCY_CYCLES
+
+
 def assert_single_packet_received(sink, expected_packet, packet_name="packet"):
     """
     Assert that exactly one packet was received and it matches the expected packet.
     
     Args:
         sink: Avalon-ST sink monitor (with packets list)
-        expected_packet: Expected packet data (list of words)
+        expected_packet: Expected packet data (list or tuple of words)
         packet_name: Name for error messages (default: "packet")
     
     Raises:
@@ -156,7 +287,34 @@ def assert_single_packet_received(sink, expected_packet, packet_name="packet"):
     assert len(sink.packets) == 1, (
         f"Expected 1 {packet_name}, got {len(sink.packets)}"
     )
-    assert sink.packets[0] == expected_packet, (
+    assert sink.packets_bytes[0] == words_to_bytes(expected_packet), (
         f"{packet_name} mismatch: expected {expected_packet}, got {sink.packets[0]}"
     )
 
+
+
+def assert_packets_received(sink, expected_packets):
+    """
+    Assert that the sink received exactly expected_packets, in order.
+    
+    All packets are compared in one go as joined bytes; only on a mismatch
+    are they walked one by one to report the first differing packet.
+    
+    Args:
+        sink: Avalon-ST sink monitor (with packets/packets_bytes)
+        expected_packets: Sequence of expected packets (lists or tuples of words)
+    
+    Raises:
+        AssertionError: If packet count or data doesn't match
+    """
+    assert len(sink.packets) == len(expected_packets), (
+        f"Expected {len(expected_packets)} packets, got {len(sink.packets)}"
+    )
+    expected_bytes = [words_to_bytes(pkt) for pkt in expected_packets]
+    if b''.join(sink.packets_bytes) == b''.join(expected_bytes):
+        return
+    for i, (got, exp) in enumerate(zip(sink.packets_bytes, expected_bytes)):
+        assert got == exp, (
+            f"Packet {i} mismatch: expected {list(expected_packets[i][:5])}..., "
+            f"got {list(sink.packets[i])[:5]}..."
+        )
@@ -2,29 +2,46 @@
 Stress and concurrent tests
 All tests comply with AV_STREAM packet constraints (46-1500 bytes, without Ethernet header).
 """
+from collections import Counter
+
 import cocotb
-from cocotb.triggers import RisingEdge
-from utils.test_utils import reset_dut, setup_clock, wait_cycles, create_packet
+from cocotb.triggers import RisingEdge, FallingEdge
+from utils.test_utils import reset_dut, wait_cycles, create_packet
 from test_helpers.test_fixtures import (
-    create_test_environment,
+    bring_up,
+    assert_packets_received,
+    expected_latency,
     create_sink_with_backpressure,
     create_queued_source_a,
     create_queued_source_b
 )
-from config import WAIT_SHORT_CYCLES, WAIT_MEDIUM_CYCLES, WAIT_LONG_CYCLES
+from config import (
+    WAIT_SHORT_CYCLES, WAIT_LONG_CYCLES,
+    MIN_PACKET_BYTES, MAX_PACKET_BYTES
+)
+
+# Packets of various valid AV_STREAM sizes for test_mixed_packet_sizes,
+# built once at import: (words, empty) per size
+_PKT_TABLE = tuple(create_packet(num_bytes) for num_bytes in (
+    MIN_PACKET_BYTES,  # Minimum: 46 bytes
+    128,
+    256,
+    512,
+    1024,
+    MAX_PACKET_BYTES,  # Maximum: 1500 bytes
+))
 
 
 @cocotb.test()
 async def test_rapid_packet_sequence(dut):
     """Many packets in quick succession."""
-    env = create_test_environment(dut)
-    await reset_dut(dut)
-    
-    cocotb.start_soon(env['sink_c'].run())
+    env = await bring_up(dut)
+    src_a = create_queued_source_a(dut)
     
     env['src_b'].set_idle()
     
-    # Send many packets rapidly
+    # Queue many packets at once; the queued source sends them with a
+    # one-cycle gap between packets
     num_packets = 20
     packets = []
     
@@ -32,23 +49,20 @@ async def test_rapid_packet_sequence(dut):
         # Create valid AV_STREAM packet (46 bytes minimum)
         pkt, empty = create_packet(64)
         packets.append(pkt)
-        await env['src_a'].send_packet(pkt, empty_last=empty)
-        await wait_cycles(dut, 2)  # Small gap between packets
+        await src_a.queue_packet(pkt, empty_last=empty)
     
-    await wait_cycles(dut, WAIT_LONG_CYCLES)
+    await src_a.flush()
+    assert await env['sink_c'].expect(num_packets, WAIT_SHORT_CYCLES, dut.clk), (
+        f"Expected {num_packets} packets, got {len(env['sink_c'].packets)}"
+    )
     
-    assert len(env['sink_c'].packets) == num_packets
-    for i, pkt in enumerate(packets):
-        assert env['sink_c'].packets[i] == pkt
+    assert_packets_received(env['sink_c'], packets)
 
 
 @cocotb.test()
 async def test_both_ports_active(dut):
     """Continuous traffic on both ports."""
-    env = create_test_environment(dut)
-    await reset_dut(dut)
-    
-    cocotb.start_soon(env['sink_c'].run())
+    env = await bring_up(dut)
     
     # Send packets from both ports
     packets_a = []
@@ -63,35 +77,28 @@ async def test_both_ports_active(dut):
         
         # Start both (A has priority)
         await env['src_a'].send_packet(pkt_a, empty_last=empty_a)
-        await wait_cycles(dut, 2)
         await env['src_b'].send_packet(pkt_b, empty_last=empty_b)
-        await wait_cycles(dut, 2)
     
-    await wait_cycles(dut, 300)
+    assert await env['sink_c'].expect(len(packets_a) + len(packets_b),
+                                      expected_latency(packets_a[0]), dut.clk), (
+        f"Expected 20 packets, got {len(env['sink_c'].packets)}"
+    )
+    
+    # Each send returns only after its last beat is taken, so the packets
+    # come out in send order: A0, B0, A1, B1, ...
+    assert_packets_received(
+        env['sink_c'], [pkt for pair in zip(packets_a, packets_b) for pkt in pair])
     
-    # Should receive all packets, A packets first due to priority
-    assert len(env['sink_c'].packets) >= 10
-    # Verify A packets come before B packets
     # Check the first word of each packet - A packets start with 0xA00000, B packets with 0xB00000
-    a_count = 0
-    b_count = 0
-    for pkt in env['sink_c'].packets:
-        if pkt[0] & 0xFF0000 == 0xA00000:  # Check upper 24 bits for 0xA00000
-            a_count += 1
-        elif pkt[0] & 0xFF0000 == 0xB00000:  # Check upper 24 bits for 0xB00000
-            b_count += 1
-    
-    assert a_count > 0, f"Expected at least one A packet, got {a_count}. Total packets: {len(env['sink_c'].packets)}"
-    assert b_count > 0, f"Expected at least one B packet, got {b_count}. Total packets: {len(env['sink_c'].packets)}"
+    tags = Counter((pkt[0] >> 16) & 0xFF for pkt in env['sink_c'].packets)
+    assert tags[0xA0] == 10, f"Expected 10 A packets, got {tags[0xA0]}"
+    assert tags[0xB0] == 10, f"Expected 10 B packets, got {tags[0xB0]}"
 
 
 @cocotb.test()
 async def test_packet_interleaving_stress(dut):
     """Complex interleaving patterns."""
-    env = create_test_environment(dut)
-    await reset_dut(dut)
-    
-    cocotb.start_soon(env['sink_c'].run())
+    env = await bring_up(dut)
     
     # Complex pattern: A, B, A, A, B, B, A, B
     # Create valid AV_STREAM packets (64 bytes each)
@@ -114,30 +121,26 @@ async def test_packet_interleaving_stress(dut):
         else:
             await env['src_b'].send_packet(pkt, empty_last=empty)
             expected_order.append(('B', pkt))
-        await wait_cycles(dut, 2)
-    
-    await wait_cycles(dut, WAIT_LONG_CYCLES)
     
-    # Verify all packets received
-    assert len(env['sink_c'].packets) == len(pattern)
+    assert await env['sink_c'].expect(len(pattern), expected_latency(pattern[0][1][0]), dut.clk), (
+        f"Expected {len(pattern)} packets, got {len(env['sink_c'].packets)}"
+    )
     
-    # Verify order: A packets should come before B packets when both are pending
-    # (due to priority)
-    received_packets = env['sink_c'].packets
-    assert len(received_packets) == len(expected_order)
+    # Verify all packets received, in send order: each send returns only
+    # after its last beat is taken, so a packet holds the arbiter before
+    # the next one is offered
+    assert_packets_received(env['sink_c'], [pkt for port, pkt in expected_order])
 
 
 @cocotb.test()
 async def test_long_continuous_stream(dut):
     """Very long continuous stream of packets."""
-    env = create_test_environment(dut)
-    await reset_dut(dut)
-    
-    cocotb.start_soon(env['sink_c'].run())
+    env = await bring_up(dut)
+    src_a = create_queued_source_a(dut)
     
     env['src_b'].set_idle()
     
-    # Send 50 packets
+    # Queue 50 packets
     num_packets = 50
     packets = []
     
@@ -145,89 +148,50 @@ async def test_long_continuous_stream(dut):
         # Create valid AV_STREAM packet (46 bytes minimum)
         pkt, empty = create_packet(64, pattern='incrementing', start_value=0x1000 + i*1000)
         packets.append(pkt)
-        await env['src_a'].send_packet(pkt, empty_last=empty)
-        await wait_cycles(dut, 1)
+        await src_a.queue_packet(pkt, empty_last=empty)
     
-    await wait_cycles(dut, 500)
+    await src_a.flush()
+    assert await env['sink_c'].expect(num_packets, WAIT_SHORT_CYCLES, dut.clk), (
+        f"Expected {num_packets} packets, got {len(env['sink_c'].packets)}"
+    )
     
-    assert len(env['sink_c'].packets) == num_packets
-    for i, pkt in enumerate(packets):
-        assert env['sink_c'].packets[i] == pkt
+    assert_packets_received(env['sink_c'], packets)
 
 
 @cocotb.test()
 async def test_mixed_packet_sizes(dut):
     """Mix of different packet sizes."""
-    env = create_test_environment(dut)
-    await reset_dut(dut)
-    
-    cocotb.start_soon(env['sink_c'].run())
+    env = await bring_up(dut)
     
     env['src_b'].set_idle()
     
-    # Packets of various valid AV_STREAM sizes
-    packets = [
-        create_packet(46),   # Minimum: 46 bytes
-        create_packet(128),  # 128 bytes
-        create_packet(256),  # 256 bytes
-        create_packet(512),  # 512 bytes
-        create_packet(1024), # 1024 bytes
-        create_packet(1500), # Maximum: 1500 bytes
-    ]
+    # Packets of various valid AV_STREAM sizes (46-1500 bytes)
+    packets = _PKT_TABLE
     
     for pkt, empty in packets:
         await env['src_a'].send_packet(pkt, empty_last=empty)
-        await wait_cycles(dut, 2)
     
-    await wait_cycles(dut, WAIT_LONG_CYCLES)
+    # Returns as soon as the last packet's EOP is seen on port C; the
+    # timeout only bounds a stuck DUT
+    assert await env['sink_c'].expect(len(packets), WAIT_LONG_CYCLES, dut.clk), (
+        f"Expected {len(packets)} packets, got {len(env['sink_c'].packets)}"
+    )
     
-    assert len(env['sink_c'].packets) == len(packets)
     # packets contains tuples (words, empty), but sink_c.packets contains just the words
-    for i, (pkt, empty) in enumerate(packets):
-        assert env['sink_c'].packets[i] == pkt, (
-            f"Packet {i} mismatch: expected {pkt[:5]}..., got {env['sink_c'].packets[i][:5]}..."
-        )
+    assert_packets_received(env['sink_c'], [pkt for pkt, empty in packets])
 
 
 @cocotb.test()
 async def test_concurrent_sop_assertion(dut):
     """Multiple concurrent SOP assertions."""
-    env = create_test_environment(dut)
-    await reset_dut(dut)
+    env = await bring_up(dut)
     
-    cocotb.start_soon(env['sink_c'].run())
-    
-    # Try to assert SOP on both ports simultaneously multiple times
-    for _ in range(5):
-        await RisingEdge(dut.clk)
-        env['src_a'].data.value = 0xAAAAAAAAAAAAAAAA
-        env['src_a'].valid.value = 1
-        env['src_a'].sop.value = 1
-        env['src_a'].eop.value = 0
-        
-        env['src_b'].data.value = 0xBBBBBBBBBBBBBBBB
-        env['src_b'].valid.value = 1
-        env['src_b'].sop.value = 1
-        env['src_b'].eop.value = 0
-        
-        await RisingEdge(dut.clk)
-        
-        # One should be selected (A has priority)
-        if env['src_a'].ready.value:
-            env['src_a'].eop.value = 1
-            await RisingEdge(dut.clk)
-            if env['src_a'].ready.value:
-                env['src_a'].valid.value = 0
-                env['src_a'].eop.value = 0
-        
-        if env['src_b'].ready.value:
-            env['src_b'].eop.value = 1
-            await RisingEdge(dut.clk)
-            if env['src_b'].ready.value:
-                env['src_b'].valid.value = 0
-                env['src_b'].eop.value = 0
-        
-        await wait_cycles(dut, 5)
+    # tb_sop_stress asserts SOP on both ports simultaneously for 5 rounds;
+    # it owns the port A/B inputs until sop_stress_busy falls
+    dut.sop_stress_start.value = 1
+    await RisingEdge(dut.clk)
+    dut.sop_stress_start.value = 0
+    await FallingEdge(dut.sop_stress_busy)
     
     await wait_cycles(dut, 50)
     
@@ -238,25 +202,20 @@ async def test_concurrent_sop_assertion(dut):
 @cocotb.test()
 async def test_high_frequency_packets(dut):
     """Packets with minimal gap between them."""
-    env = create_test_environment(dut)
-    await reset_dut(dut)
-    
-    cocotb.start_soon(env['sink_c'].run())
+    env = await bring_up(dut)
     
     env['src_b'].set_idle()
     
-    # Send packets with minimal gap
+    # Send packets with no gap: valid stays high from the first SOP to
+    # the last EOP
     num_packets = 15
-    packets = []
+    # Create valid AV_STREAM packets (46 bytes minimum)
+    packets = [create_packet(64) for _ in range(num_packets)]
     
-    for i in range(num_packets):
-        # Create valid AV_STREAM packet (46 bytes minimum)
-        pkt, empty = create_packet(64)
-        packets.append(pkt)
-        await env['src_a'].send_packet(pkt, empty_last=empty)
-        # No wait - back-to-back
-    
-    await wait_cycles(dut, 300)
+    await env['src_a'].send_packet_stream(packets)
+    assert await env['sink_c'].expect(num_packets, WAIT_SHORT_CYCLES, dut.clk), (
+        f"Expected {num_packets} packets, got {len(env['sink_c'].packets)}"
+    )
     
     assert len(env['sink_c'].packets) == num_packets
 
@@ -264,8 +223,6 @@ async def test_high_frequency_packets(dut):
 @cocotb.test()
 async def test_alternating_ports_stress(dut):
     """Stress test with queued packets from both ports - proper arbitration and backpressure."""
-    # Setup clock
-    cocotb.start_soon(setup_clock(dut))
     await reset_dut(dut)
     
     # Create queued drivers for both ports
@@ -301,25 +258,15 @@ async def test_alternating_ports_stress(dut):
     # Each packet is 8 words, with backpressure pattern (3 ready, 1 not ready)
     # Worst case: 8 words * 4 cycles/word = 32 cycles per packet
     # Plus FIFO buffering delays for port B
-    max_wait_cycles = total_packets * 50  # Very generous timeout for FIFO + backpressure
-    cycles_waited = 0
-    for _ in range(max_wait_cycles):
-        await RisingEdge(dut.clk)
-        cycles_waited += 1
-        # Check if all packets received AND queues are empty
-        if len(sink_c.packets) >= total_packets and src_a.get_queue_size() == 0 and src_b.get_queue_size() == 0:
-            break
-    
-    # Give extra time for any remaining packets to drain
-    # Port B FIFO might still have packets buffered
-    for _ in range(200):
-        await RisingEdge(dut.clk)
-        if len(sink_c.packets) >= total_packets and src_a.get_queue_size() == 0 and src_b.get_queue_size() == 0:
-            break
+    # Sleep until the sink reports each packet instead of polling every
+    # clock; a packet completes far more often than every 200 cycles
+    # unless the DUT has stalled
+    per_packet_timeout = 200  # Very generous timeout for FIFO + backpressure
+    received = await sink_c.expect(total_packets, per_packet_timeout, dut.clk)
     
     # Verify all packets were received
-    assert len(sink_c.packets) == total_packets, (
-        f"Expected {total_packets} packets, got {len(sink_c.packets)} after {cycles_waited} cycles. "
+    assert received and len(sink_c.packets) == total_packets, (
+        f"Expected {total_packets} packets, got {len(sink_c.packets)}. "
         f"Queue A: {src_a.get_queue_size()}, Queue B: {src_b.get_queue_size()}"
     )
     
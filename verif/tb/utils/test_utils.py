@@ -1,70 +1,24 @@
 """
 Common test utility functions
 """
-import cocotb
-from cocotb.triggers import RisingEdge
-from cocotb.clock import Clock
-import os
+from cocotb.handle import Immediate
+from cocotb.triggers import Edge, ClockCycles, First
+import functools
 import random
-try:
-    from config import CLOCK_PERIOD_NS, RESET_CYCLES, RESET_DEASSERT_DELAY, PACKET_TIMEOUT_CYCLES
-except ImportError:
-    # Fallback if import fails
-    CLOCK_PERIOD_NS = 6.4
-    RESET_CYCLES = 5
-    RESET_DEASSERT_DELAY = 2
-    PACKET_TIMEOUT_CYCLES = 1000
-
-
-def enable_vcd_dump(dut, vcd_filename=None):
-    """
-    Enable VCD waveform dumping for Verilator simulations.
-    
-    Args:
-        dut: Device under test
-        vcd_filename: Optional VCD filename (defaults to sim_build/Vtop.vcd)
-    
-    Returns:
-        True if VCD dumping was enabled, False otherwise
-    """
-    if vcd_filename is None:
-        # Default VCD file location
-        vcd_filename = "sim_build/Vtop.vcd"
-    
-    try:
-        # For Verilator, we need to access the simulator handle
-        # Cocotb provides access through the simulator module
-        import cocotb.simulator
-        
-        # Get the simulator handle
-        sim = cocotb.simulator.get_simulator()
-        
-        # For Verilator, we can enable VCD through the handle
-        # The actual implementation depends on cocotb version
-        # Try to set VCD dumping through environment or direct access
-        
-        # Set environment variable that Verilator might use
-        os.environ['VERILATOR_TRACE'] = '1'
-        os.environ['VERILATOR_TRACE_FILE'] = vcd_filename
-        
-        # Try to access the Verilated model and enable trace
-        # This is simulator-specific
-        try:
-            # Access the underlying Verilated model
-            # Note: This is implementation-dependent
-            handle = sim._handle if hasattr(sim, '_handle') else None
-            
-            if handle:
-                # If we can access the handle, try to enable VCD
-                # This would require C++ bindings which may not be available
-                pass
-        except:
-            pass
-        
-        return True
-    except Exception as e:
-        cocotb.log.warning(f"Could not enable VCD dumping: {e}")
-        return False
+import struct
+from config import (
+    RESET_CYCLES, RESET_DEASSERT_DELAY, PACKET_TIMEOUT_CYCLES,
+    MIN_PACKET_BYTES, MAX_PACKET_BYTES, BYTES_PER_WORD,
+)
+
+# Inputs driven to 0 by reset_dut: per-field ports, or with a tb_top built
+# with TB_BUNDLE_PORTS the port A/B bundles the fields come from
+_RESET_SIGNALS = (
+    'porta_valid', 'porta_sop', 'porta_eop', 'porta_empty', 'porta_error',
+    'portb_valid', 'portb_sop', 'portb_eop', 'portb_empty', 'portb_error',
+    'portc_ready',
+)
+_RESET_SIGNALS_BUNDLED = ('porta_bundle', 'portb_bundle', 'portc_ready')
 
 
 async def reset_dut(dut, cycles=None):
@@ -78,67 +32,65 @@ async def reset_dut(dut, cycles=None):
     if cycles is None:
         cycles = RESET_CYCLES
     
-    dut.rst_n.value = 0
+    # Assert reset and drive all inputs to safe defaults. Everything here
+    # lands in the same timestep with reset asserted, so the order does
+    # not matter and the writes are immediate rather than scheduled for
+    # the end of the timestep.
+    dut.rst_n.value = Immediate(0)
+    signals = _RESET_SIGNALS_BUNDLED if hasattr(dut, 'porta_bundle') else _RESET_SIGNALS
+    for name in signals:
+        getattr(dut, name).value = Immediate(0)
 
-    # drive all inputs to safe defaults
-    dut.porta_valid.value = 0
-    dut.porta_sop.value   = 0
-    dut.porta_eop.value   = 0
-    dut.porta_empty.value = 0
-    dut.porta_error.value = 0
-
-    dut.portb_valid.value = 0
-    dut.portb_sop.value   = 0
-    dut.portb_eop.value   = 0
-    dut.portb_empty.value = 0
-    dut.portb_error.value = 0
-
-    dut.portc_ready.value = 0
-
-    for _ in range(cycles):
-        await RisingEdge(dut.clk)
+    # one trigger per phase instead of one per clock
+    await ClockCycles(dut.clk, cycles)
 
     dut.rst_n.value = 1
-    for _ in range(RESET_DEASSERT_DELAY):
-        await RisingEdge(dut.clk)
+    await ClockCycles(dut.clk, RESET_DEASSERT_DELAY)
 
 
-def setup_clock(dut, period_ns=None):
+def wait_cycles(dut, cycles):
     """
-    Setup clock for the DUT.
+    Wait for specified number of clock cycles.
+    Returns a single ClockCycles trigger, so callers still write
+    ``await wait_cycles(dut, n)``.
     
     Args:
         dut: Device under test
-        period_ns: Clock period in nanoseconds (defaults to config.CLOCK_PERIOD_NS)
+        cycles: Number of cycles to wait
     
     Returns:
-        Clock coroutine
+        ClockCycles trigger to await
     """
-    if period_ns is None:
-        period_ns = CLOCK_PERIOD_NS
-    
-    return Clock(dut.clk, period_ns, unit="ns").start()
+    return ClockCycles(dut.clk, cycles)
 
 
-async def wait_cycles(dut, cycles):
+async def wait_for_ready_stable(sig, clk, cycles):
     """
-    Wait for specified number of clock cycles.
+    Wait up to a number of clock cycles for a signal to change.
+    One combined trigger instead of a wake-up per cycle.
     
     Args:
-        dut: Device under test
+        sig: Signal to watch (e.g. dut.porta_ready)
+        clk: Clock the cycles are counted on
         cycles: Number of cycles to wait
+    
+    Returns:
+        True if the signal held its value for all cycles, False if it changed
     """
-    for _ in range(cycles):
-        await RisingEdge(dut.clk)
+    timeout = ClockCycles(clk, cycles)
+    return await First(Edge(sig), timeout) is timeout
 
 
 async def wait_for_packet(sink, timeout_cycles=None, min_packets=1):
     """
     Wait for at least min_packets to be collected by the sink.
+    Sleeps on the sink's packet-completed event (see AvalonSTSink.expect)
+    instead of checking the packet count every clock.
     
     Args:
-        sink: AvalonSTSink monitor
-        timeout_cycles: Maximum cycles to wait (defaults to config.PACKET_TIMEOUT_CYCLES)
+        sink: AvalonSTSink or AvalonSTSinkWithBackpressure monitor
+        timeout_cycles: Maximum cycles to wait for each packet
+                        (defaults to config.PACKET_TIMEOUT_CYCLES)
         min_packets: Minimum number of packets to wait for
     
     Returns:
@@ -146,13 +98,22 @@ async def wait_for_packet(sink, timeout_cycles=None, min_packets=1):
     """
     if timeout_cycles is None:
         timeout_cycles = PACKET_TIMEOUT_CYCLES
+    return await sink.expect(min_packets, timeout_cycles)
+
+
+def words_to_bytes(words):
+    """
+    Pack a packet's 64-bit words into little-endian bytes, the form the
+    sink monitors keep in packets_bytes. Comparing two packets as bytes
+    is a single memcmp instead of one int compare per word.
     
-    for _ in range(timeout_cycles):
-        if sink.get_packet_count() >= min_packets:
-            return True
-        await RisingEdge(sink.clk)
+    Args:
+        words: List (or tuple) of data words
     
-    return False
+    Returns:
+        bytes of length 8 * len(words)
+    """
+    return struct.pack(f'<{len(words)}Q', *words)
 
 
 def create_packet(num_bytes=None, pattern='random', start_value=0x1000, seed=None):
@@ -177,16 +138,13 @@ def create_packet(num_bytes=None, pattern='random', start_value=0x1000, seed=Non
     Raises:
         ValueError: If num_bytes is outside valid range
     """
-    
-    from config import MIN_PACKET_BYTES, MAX_PACKET_BYTES, BYTES_PER_WORD    
-    
-    # Set random seed once at the beginning if provided (for reproducibility)
-    if seed is not None:
-        random.seed(seed)
+    # A seed gets its own generator (for reproducibility) instead of
+    # reseeding the module-global one that every other caller shares
+    rng = random.Random(seed) if seed is not None else random
     
     # Randomize num_bytes if not specified
     if num_bytes is None:
-        num_bytes = random.randint(MIN_PACKET_BYTES, MAX_PACKET_BYTES)
+        num_bytes = rng.randint(MIN_PACKET_BYTES, MAX_PACKET_BYTES)
     
     if num_bytes < MIN_PACKET_BYTES or num_bytes > MAX_PACKET_BYTES:
         raise ValueError(
@@ -196,31 +154,63 @@ def create_packet(num_bytes=None, pattern='random', start_value=0x1000, seed=Non
     
     num_words = (num_bytes + BYTES_PER_WORD - 1) // BYTES_PER_WORD  # Ceiling division
     empty_last = (num_words * BYTES_PER_WORD) - num_bytes
-    valid_bytes_last = BYTES_PER_WORD - empty_last  # Number of valid bytes in last word
-    
-    # Generate packet words
+
+    if pattern == 'random':
+        # Generate random 64-bit values (from the seeded generator if any).
+        # One wide getrandbits() split by struct yields the same words as
+        # num_words separate getrandbits(64) calls, without the Python loop.
+        words = list(struct.unpack(
+            f'<{num_words}Q',
+            rng.getrandbits(64 * num_words).to_bytes(8 * num_words, 'little')))
+        return _mask_last_word(words, empty_last), empty_last
+
+    # Every other pattern is a pure function of its arguments; hand out a
+    # fresh list so callers may still modify their copy
+    return list(_pattern_words(num_words, empty_last, pattern, start_value)), empty_last
+
+
+# Constant patterns prebuilt at the largest legal packet size (including a
+# partially used last word); shorter packets take a slice
+_MAX_WORDS = (MAX_PACKET_BYTES + BYTES_PER_WORD - 1) // BYTES_PER_WORD
+_ONES_WORDS  = (0xFFFFFFFFFFFFFFFF,) * _MAX_WORDS
+_ZEROS_WORDS = (0x0000000000000000,) * _MAX_WORDS
+_ALT_WORDS   = ((0xAAAAAAAAAAAAAAAA, 0x5555555555555555) * ((_MAX_WORDS + 1) // 2))[:_MAX_WORDS]
+
+
+# Big enough for every distinct deterministic packet of a full regression
+# (the stress tests alone use ~100 incrementing start values), so tests
+# never evict each other's entries
+@functools.lru_cache(maxsize=256)
+def _pattern_words(num_words, empty_last, pattern, start_value):
+    """Build (and cache) the words of a non-random packet as a tuple."""
     if pattern == 'incrementing':
         words = list(range(start_value, start_value + num_words))
     elif pattern == 'all_ones':
-        words = [0xFFFFFFFFFFFFFFFF] * num_words
+        words = list(_ONES_WORDS[:num_words])
     elif pattern == 'all_zeros':
-        words = [0x0000000000000000] * num_words
+        words = list(_ZEROS_WORDS[:num_words])
     elif pattern == 'alternating':
-        words = [0xAAAAAAAAAAAAAAAA if i % 2 == 0 else 0x5555555555555555 
-                 for i in range(num_words)]
-    elif pattern == 'random':
-        # Generate random 64-bit values (seed already set above if provided)
-        words = [random.getrandbits(64) for _ in range(num_words)]
+        words = list(_ALT_WORDS[:num_words])
     else:
-        words = [0xDEADBEEFCAFEBABE + i for i in range(num_words)]
-    
-    # Mask the last word based on empty field
-    # Only the valid bytes should contain pattern data, rest should be zero    
-    if empty_last > 0 and num_words > 0:
-        last_word = words[-1]        
+        words = list(range(0xDEADBEEFCAFEBABE, 0xDEADBEEFCAFEBABE + num_words))
+    return tuple(_mask_last_word(words, empty_last))
+
+
+def _mask_last_word(words, empty_last):
+    """
+    Mask the last word based on empty field.
+    Only the valid bytes should contain pattern data, rest should be zero.
+    """
+    if empty_last > 0 and words:
+        valid_bytes_last = BYTES_PER_WORD - empty_last  # Number of valid bytes in last word
         mask = (1 << (valid_bytes_last * 8)) - 1
-        words[-1] = last_word & mask
-    
-    return words, empty_last
+        words[-1] &= mask
+    return words
 
 
+# Default 64-byte packet (random pattern), built once at import for the
+# many tests that just need "a packet". A tuple, so no test can change it
+# for the others.
+_pkt_64, EMPTY_64_DEFAULT = create_packet(64)
+PKT_64_DEFAULT = tuple(_pkt_64)
+del _pkt_64